@@ -9,6 +9,7 @@ L'utente può:
 """
 
 import os
+import requests
 import streamlit as st
 
 # Importo le funzioni della pipeline RAG
@@ -17,6 +18,7 @@ from rag_pipeline import (
     carica_vector_store,
     crea_catena_rag,
     fai_domanda,
+    riscalda_llm,
 )
 import config
 
@@ -30,30 +32,58 @@ st.set_page_config(
 )
 
 
+@st.cache_resource
+def sessione_ollama() -> requests.Session:
+    """
+    Restituisce una sessione HTTP persistente verso Ollama.
+
+    La sessione tiene aperta la connessione (keep-alive) tra una richiesta
+    e l'altra, così i controlli a ogni rerun di Streamlit non rifanno
+    ogni volta la connessione TCP. st.cache_resource la conserva tra i rerun
+    (una variabile globale verrebbe ricreata a ogni esecuzione dello script).
+
+    Returns:
+        oggetto requests.Session condiviso
+    """
+    sessione = requests.Session()
+    sessione.mount(
+        "http://",
+        requests.adapters.HTTPAdapter(pool_connections=2, pool_maxsize=4),
+    )
+    return sessione
+
+
+@st.cache_data(ttl=5)
 def controlla_ollama() -> bool:
     """
     Verifica se Ollama è in esecuzione e raggiungibile.
 
     Prova a fare una richiesta HTTP al server Ollama.
     Se fallisce, significa che Ollama non è avviato.
+    Il risultato resta in cache per 5 secondi: Streamlit riesegue lo script
+    a ogni interazione e non serve contattare Ollama ogni volta.
 
     Returns:
         True se Ollama risponde, False altrimenti
     """
-    import urllib.request
-
     try:
-        # Provo a contattare il server Ollama
-        urllib.request.urlopen(config.OLLAMA_BASE_URL, timeout=3)
+        # Provo a contattare il server Ollama (riusando la connessione)
+        risposta = sessione_ollama().get(config.OLLAMA_BASE_URL, timeout=3)
+        # Un errore HTTP (4xx/5xx) significa server non sano o non Ollama
+        risposta.raise_for_status()
         return True
     except Exception:
         return False
 
 
+@st.cache_data(ttl=2)
 def lista_documenti() -> list:
     """
     Restituisce la lista dei file PDF nella cartella documents/.
 
+    Il risultato resta in cache per 2 secondi (evita di rileggere
+    la cartella a ogni rerun di Streamlit).
+
     Returns:
         lista di nomi file PDF trovati
     """
@@ -64,6 +94,46 @@ def lista_documenti() -> list:
     return [f for f in os.listdir(config.DOCUMENTS_DIR) if f.lower().endswith(".pdf")]
 
 
+@st.cache_resource(show_spinner=False)
+def carica_indice():
+    """
+    Carica il vector store da disco una sola volta per tutta l'app.
+
+    Streamlit riesegue lo script a ogni interazione: grazie a
+    st.cache_resource il database (e il modello di embedding) non vengono
+    riaperti a ogni rerun né per ogni nuova sessione del browser.
+    Dopo una re-indicizzazione la cache va svuotata con carica_indice.clear().
+
+    Returns:
+        oggetto Chroma se trovato, None altrimenti
+    """
+    return carica_vector_store()
+
+
+@st.cache_resource(show_spinner="🔥 Caricamento del modello Ollama...")
+def crea_catena(_vector_store):
+    """
+    Crea la catena RAG una sola volta per tutta l'app.
+
+    Subito dopo "riscalda" Ollama (1 token generato), così il modello è già
+    in RAM alla prima domanda. Può richiedere qualche secondo: Streamlit
+    mostra uno spinner mentre aspetta.
+
+    Il parametro inizia con "_" così Streamlit non prova a calcolarne
+    l'hash: c'è un solo indice, quindi la cache ha una sola voce.
+    Dopo una re-indicizzazione va svuotata con crea_catena.clear().
+
+    Args:
+        _vector_store: il database vettoriale con i chunk indicizzati
+
+    Returns:
+        dizionario con i componenti RAG (vedi crea_catena_rag())
+    """
+    catena = crea_catena_rag(_vector_store)
+    riscalda_llm(catena["llm"])
+    return catena
+
+
 # === SIDEBAR ===
 # La sidebar contiene i controlli: indicizzazione e lista documenti
 with st.sidebar:
@@ -98,25 +168,29 @@ with st.sidebar:
                 "📊 Indicizzazione in corso... (può richiedere qualche minuto)"
             ):
                 try:
-                    # Se esiste già un vector store aperto, lo chiudo
-                    # prima di re-indicizzare. Altrimenti ChromaDB tiene
-                    # il file SQLite bloccato e la cancellazione fallisce.
+                    # Se esiste già un vector store aperto, lo tolgo dalla
+                    # sessione: verrà sostituito da quello aggiornato.
+                    # Il database non viene cancellato: i chunk già presenti
+                    # (stesso ID) non vengono ricalcolati.
                     if "vector_store" in st.session_state:
-                        try:
-                            # Chiudo il client ChromaDB per rilasciare il lock sul DB
-                            st.session_state["vector_store"]._client.close()
-                        except Exception:
-                            pass
                         del st.session_state["vector_store"]
                         del st.session_state["catena"]
 
                     # Lancio la pipeline completa
+                    # (non è in cache: è un'azione esplicita dell'utente)
                     vector_store = indicizza_documenti()
 
+                    # L'indice in cache è cambiato: le prossime sessioni
+                    # devono ricaricarlo. Aggiorno anche lo stato mostrato
+                    carica_indice.clear()
+                    crea_catena.clear()
+                    lista_documenti.clear()
+                    controlla_ollama.clear()
+
                     # Salvo il vector store nella sessione di Streamlit
                     # così resta disponibile tra le interazioni
                     st.session_state["vector_store"] = vector_store
-                    st.session_state["catena"] = crea_catena_rag(vector_store)
+                    st.session_state["catena"] = crea_catena(vector_store)
 
                     st.success("✅ Indicizzazione completata!")
                 except Exception as e:
@@ -151,10 +225,10 @@ st.markdown(
 # All'avvio, provo a caricare un vector store esistente
 # (così non serve re-indicizzare se è già stato fatto prima)
 if "vector_store" not in st.session_state:
-    vector_store = carica_vector_store()
+    vector_store = carica_indice()
     if vector_store is not None:
         st.session_state["vector_store"] = vector_store
-        st.session_state["catena"] = crea_catena_rag(vector_store)
+        st.session_state["catena"] = crea_catena(vector_store)
 
 # Campo per inserire la domanda
 domanda = st.text_input(
@@ -173,25 +247,27 @@ if domanda:
         st.error("❌ Ollama non è in esecuzione! " "Avvialo con: `ollama serve`")
     else:
         # Tutto pronto: faccio la domanda alla pipeline RAG
-        with st.spinner("🤔 Sto elaborando la risposta..."):
-            try:
+        try:
+            # Lo spinner copre solo la ricerca dei chunk:
+            # la risposta appare man mano che viene generata
+            with st.spinner("🤔 Sto cercando nei documenti..."):
                 risultato = fai_domanda(domanda, st.session_state["catena"])
 
-                # Mostro la risposta principale
-                st.subheader("💬 Risposta")
-                st.markdown(risultato["risposta"])
-
-                # Mostro le fonti usate in un expander (sezione espandibile)
-                st.subheader("📖 Fonti")
-                for i, fonte in enumerate(risultato["fonti"], 1):
-                    with st.expander(
-                        f"Fonte {i}: {fonte['documento']} - Pagina {fonte['pagina']}"
-                    ):
-                        # Mostro un estratto del chunk usato
-                        st.text(fonte["testo_chunk"])
-
-            except Exception as e:
-                st.error(f"❌ Errore nella generazione della risposta: {e}")
+            # Mostro la risposta principale, token per token
+            st.subheader("💬 Risposta")
+            st.write_stream(risultato["risposta"])
+
+            # Mostro le fonti usate in un expander (sezione espandibile)
+            st.subheader("📖 Fonti")
+            for i, fonte in enumerate(risultato["fonti"], 1):
+                with st.expander(
+                    f"Fonte {i}: {fonte['documento']} - Pagina {fonte['pagina']}"
+                ):
+                    # Mostro un estratto del chunk usato (solo i primi 300 char)
+                    st.text(fonte["_doc"].page_content[:300] + "...")
+
+        except Exception as e:
+            st.error(f"❌ Errore nella generazione della risposta: {e}")
 
 # Footer con istruzioni
 st.divider()
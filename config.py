@@ -30,9 +30,28 @@ CHUNK_OVERLAP = 200
 # all-MiniLM-L6-v2 è leggero (~80MB) e veloce, ottimo per iniziare
 EMBEDDING_MODEL = "all-MiniLM-L6-v2"
 
-# Percorso locale del modello di embedding (scaricato da setup_offline.py)
-# Se esiste la cartella locale, usa quella; altrimenti scarica da HuggingFace
-EMBEDDING_MODEL_PATH = os.path.join(MODELS_DIR, EMBEDDING_MODEL)
+# Nome dello stesso modello nel catalogo di fastembed (versione ONNX)
+# fastembed lo salva in MODELS_DIR (scaricato da setup_offline.py)
+EMBEDDING_MODEL_FASTEMBED = f"sentence-transformers/{EMBEDDING_MODEL}"
+
+# Cartella con la versione quantizzata int8 del modello (creata da setup_offline.py)
+# Se esiste ed è completa, usa quella: pesi 4x più piccoli e calcoli int8
+# (VNNI) più veloci;
+# altrimenti usa il modello float32 di fastembed
+EMBEDDING_MODEL_INT8_PATH = os.path.join(MODELS_DIR, f"{EMBEDDING_MODEL}-int8")
+
+# File che devono esserci perché il modello int8 sia utilizzabile
+# (se ne manca qualcuno la cartella è incompleta e viene ignorata)
+EMBEDDING_MODEL_INT8_FILES = [
+    "model.onnx",
+    "config.json",
+    "tokenizer.json",
+    "tokenizer_config.json",
+]
+
+# Quanti chunk codificare per ogni passata del modello di embedding
+# Batch grandi (64-256) sfruttano molto meglio la CPU rispetto a batch piccoli
+EMBEDDING_BATCH_SIZE = 128
 
 # === MODALITÀ OFFLINE ===
 # Blocca qualsiasi tentativo di scaricare modelli da internet a runtime.
@@ -40,6 +59,25 @@ EMBEDDING_MODEL_PATH = os.path.join(MODELS_DIR, EMBEDDING_MODEL)
 os.environ["HF_HUB_OFFLINE"] = "1"
 os.environ["TRANSFORMERS_OFFLINE"] = "1"
 
+# === VECTOR STORE ===
+# Quanti chunk scrivere in ChromaDB per ogni chiamata
+# Blocchi grandi = meno transazioni SQLite durante l'indicizzazione
+CHROMA_BATCH_SIZE = 512
+
+# Parametri dell'indice HNSW di ChromaDB (ricerca approssimata dei vicini)
+# M = collegamenti per nodo, construction_ef/search_ef = ampiezza della ricerca
+# in costruzione/interrogazione. Valori più alti = più precisione, meno velocità.
+# NOTA: ChromaDB li applica solo alla creazione dell'indice; se cambiano,
+# l'indice esistente viene ricreato vuoto e serve re-indicizzare.
+# "ip" = prodotto scalare: con vettori normalizzati equivale al coseno,
+# ma evita di ri-normalizzare a ogni confronto.
+CHROMA_HNSW = {
+    "hnsw:space": "ip",
+    "hnsw:M": 32,
+    "hnsw:construction_ef": 200,
+    "hnsw:search_ef": 64,
+}
+
 # === LLM (Ollama) ===
 # URL del server Ollama locale
 OLLAMA_BASE_URL = "http://localhost:11434"
@@ -52,10 +90,22 @@ OLLAMA_MODEL = "llama3.2:3b"
 # Per RAG su documenti scientifici, meglio tenerla bassa
 OLLAMA_TEMPERATURE = 0.1
 
+# Per quanti secondi tenere aperta la connessione HTTP verso Ollama
+# tra una domanda e l'altra (evita di riaprirla a ogni domanda)
+OLLAMA_KEEPALIVE_SECONDI = 60
+
 # === RETRIEVAL ===
 # Quanti chunk simili recuperare per ogni domanda
-# 4 è un buon default: abbastanza contesto senza sovraccaricare il prompt
-TOP_K = 4
+# Con la ricerca MMR i chunk sono più vari, quindi 3 bastano
+# per avere abbastanza contesto senza sovraccaricare il prompt
+TOP_K = 3
+
+# Quanti chunk candidati considerare prima di scegliere i TOP_K più vari (MMR)
+FETCH_K = 20
+
+# Bilancio tra rilevanza e varietà nella ricerca MMR
+# 1 = solo rilevanza (come la ricerca normale), 0 = massima varietà
+MMR_LAMBDA = 0.5
 
 # === NOME COLLEZIONE CHROMADB ===
 # Nome della collezione nel database vettoriale
@@ -0,0 +1,45 @@
+"""
+Caricamento di un singolo PDF.
+
+Modulo volutamente "leggero": importa solo il loader di PyMuPDF.
+carica_pdf() in rag_pipeline.py lo usa nei processi separati che caricano
+i PDF in parallelo, e ogni processo deve importare questo modulo:
+se il codice stesse in rag_pipeline.py, ogni processo dovrebbe caricare
+anche fastembed, ChromaDB e il resto della pipeline.
+"""
+
+import os
+
+from langchain_community.document_loaders import PyMuPDFLoader
+
+
+def carica_un_pdf(percorso_pdf: str) -> list:
+    """
+    Carica un singolo PDF e aggiunge il nome del file ai metadati.
+
+    Args:
+        percorso_pdf: percorso del file PDF
+
+    Returns:
+        lista di Document (uno per pagina), vuota se il caricamento fallisce
+    """
+    nome_file = os.path.basename(percorso_pdf)
+    print(f"📄 Caricamento: {nome_file}")
+
+    try:
+        # PyMuPDFLoader estrae il testo da ogni pagina del PDF
+        # (usa PyMuPDF, scritto in C: molto più veloce di pypdf)
+        loader = PyMuPDFLoader(percorso_pdf)
+        pagine = loader.load()
+
+        # Aggiungo il nome del file ai metadati di ogni pagina
+        # così dopo posso citare la fonte nella risposta
+        for pagina in pagine:
+            pagina.metadata["source_filename"] = nome_file
+
+        print(f"   ✅ {nome_file}: caricate {len(pagine)} pagine")
+        return pagine
+
+    except Exception as e:
+        print(f"   ❌ Errore nel caricamento di {nome_file}: {e}")
+        return []
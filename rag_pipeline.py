@@ -10,27 +10,37 @@ Questo modulo gestisce tutto il flusso RAG:
 6. Passa i chunk + domanda a Ollama per generare la risposta
 """
 
+import hashlib
+import multiprocessing
 import os
-import shutil
-from typing import Optional
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Iterator, Optional
+
+import httpx
+import numpy as np
 
 # LangChain: framework per orchestrare la pipeline
 # NOTA: nelle versioni recenti di LangChain (v1.x), i moduli sono stati
 # spostati in pacchetti separati (langchain_community, langchain_text_splitters, ecc.)
-from langchain_community.document_loaders import PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_community.vectorstores import Chroma
+from langchain_core.embeddings import Embeddings
 from langchain_ollama import OllamaLLM
 from langchain_core.prompts import PromptTemplate
 
+# fastembed: esegue il modello di embedding con ONNX Runtime (niente PyTorch)
+from fastembed import TextEmbedding
+
 # Importa la configurazione centralizzata
 import config
 
+# Caricamento del singolo PDF (in un modulo leggero, usato dai processi paralleli)
+from pdf_loader import carica_un_pdf
 
-# Template del prompt: istruzioni chiare per il modello
-# {context} verrà sostituito con i chunk trovati
-# {question} verrà sostituito con la domanda dell'utente
+
+# Template del prompt (formato jinja2): istruzioni chiare per il modello
+# Il ciclo su context_docs inserisce i chunk trovati, separati da "---"
+# {{ question }} verrà sostituito con la domanda dell'utente
 TEMPLATE_PROMPT = """Sei un assistente esperto che risponde a domande basandosi ESCLUSIVAMENTE sui documenti forniti.
 
 REGOLE IMPORTANTI:
@@ -41,9 +51,13 @@ REGOLE IMPORTANTI:
 5. Sii preciso e conciso
 
 CONTESTO (estratto dai documenti):
-{context}
+{% for doc in context_docs %}{% if not loop.first %}
+
+---
 
-DOMANDA: {question}
+{% endif %}{{ doc.page_content }}{% endfor %}
+
+DOMANDA: {{ question }}
 
 RISPOSTA (con citazione delle fonti):"""
 
@@ -54,6 +68,8 @@ def carica_pdf(cartella: str = config.DOCUMENTS_DIR) -> list:
 
     Ogni pagina di ogni PDF diventa un "Document" di LangChain,
     con il testo della pagina e i metadati (nome file, numero pagina).
+    Con più PDF, ognuno viene caricato in un processo separato (max 8):
+    PyMuPDF non è thread-safe, ma processi diversi non condividono nulla.
 
     Args:
         cartella: percorso alla cartella con i PDF
@@ -76,28 +92,51 @@ def carica_pdf(cartella: str = config.DOCUMENTS_DIR) -> list:
         print(f"⚠️ Nessun PDF trovato in: {cartella}")
         return documenti
 
-    for percorso_pdf in file_pdf:
-        nome_file = os.path.basename(percorso_pdf)
-        print(f"📄 Caricamento: {nome_file}")
+    if len(file_pdf) == 1:
+        # Un solo PDF: lo carico qui, avviare un processo non conviene
+        risultati = [carica_un_pdf(file_pdf[0])]
+    else:
+        # "spawn": ogni processo parte da zero e importa solo pdf_loader
+        # (niente fork di un processo con thread già attivi, es. Streamlit).
+        # ex.map mantiene l'ordine dei file, quindi il risultato è deterministico
+        with ProcessPoolExecutor(
+            max_workers=min(8, len(file_pdf)),
+            mp_context=multiprocessing.get_context("spawn"),
+        ) as ex:
+            risultati = list(ex.map(carica_un_pdf, file_pdf))
+
+    for pagine in risultati:
+        documenti.extend(pagine)
 
-        try:
-            # PyPDFLoader estrae il testo da ogni pagina del PDF
-            loader = PyPDFLoader(percorso_pdf)
-            pagine = loader.load()
+    print(f"\n📚 Totale: {len(documenti)} pagine da {len(file_pdf)} PDF")
+    return documenti
 
-            # Aggiungo il nome del file ai metadati di ogni pagina
-            # così dopo posso citare la fonte nella risposta
-            for pagina in pagine:
-                pagina.metadata["source_filename"] = nome_file
 
-            documenti.extend(pagine)
-            print(f"   ✅ Caricate {len(pagine)} pagine")
+def _crea_splitter(
+    chunk_size: int, chunk_overlap: int
+) -> RecursiveCharacterTextSplitter:
+    """
+    Crea lo splitter con la strategia "ricorsiva".
 
-        except Exception as e:
-            print(f"   ❌ Errore nel caricamento di {nome_file}: {e}")
+    I separatori sono provati in ordine: prima paragrafi, poi frasi, poi spazi.
 
-    print(f"\n📚 Totale: {len(documenti)} pagine da {len(file_pdf)} PDF")
-    return documenti
+    Args:
+        chunk_size: dimensione massima di ogni chunk (in caratteri)
+        chunk_overlap: sovrapposizione tra chunk consecutivi
+
+    Returns:
+        oggetto RecursiveCharacterTextSplitter
+    """
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        separators=["\n\n", "\n", ". ", " ", ""],  # dal più grande al più piccolo
+        length_function=len,  # misura la lunghezza in caratteri
+    )
+
+
+# Splitter con i parametri di config.py, creato una sola volta all'import
+_SPLITTER = _crea_splitter(config.CHUNK_SIZE, config.CHUNK_OVERLAP)
 
 
 def chunking(
@@ -124,14 +163,12 @@ def chunking(
     Returns:
         lista di Document (chunk), ognuno con i metadati originali
     """
-    # Creo lo splitter con la strategia "ricorsiva"
-    # I separatori sono provati in ordine: prima paragrafi, poi frasi, poi spazi
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size,
-        chunk_overlap=chunk_overlap,
-        separators=["\n\n", "\n", ". ", " ", ""],  # dal più grande al più piccolo
-        length_function=len,  # misura la lunghezza in caratteri
-    )
+    # Con i parametri di default uso lo splitter già pronto,
+    # altrimenti ne creo uno apposta
+    if chunk_size == config.CHUNK_SIZE and chunk_overlap == config.CHUNK_OVERLAP:
+        splitter = _SPLITTER
+    else:
+        splitter = _crea_splitter(chunk_size, chunk_overlap)
 
     # Divido tutti i documenti in chunk
     chunks = splitter.split_documents(documenti)
@@ -140,31 +177,173 @@ def chunking(
     return chunks
 
 
-def _crea_embeddings() -> HuggingFaceEmbeddings:
+class FastEmbedEmbeddings(Embeddings):
+    """
+    Embeddings di LangChain basati su fastembed (ONNX Runtime).
+
+    Rispetto a HuggingFaceEmbeddings non serve caricare PyTorch e transformers:
+    il modello gira con i kernel ottimizzati di ONNX Runtime, l'avvio è molto
+    più rapido e i testi vengono codificati in batch usando tutti i core.
+    I vettori sono normalizzati (lunghezza 1), così la ricerca può usare
+    il prodotto scalare al posto della similarità coseno.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        cache_dir: Optional[str] = None,
+        batch_size: int = 256,
+        model_warmup: bool = False,
+        specific_model_path: Optional[str] = None,
+    ):
+        # Carico il modello ONNX (dalla cache locale se già scaricato,
+        # oppure da una cartella specifica, es. la versione quantizzata int8)
+        self.client = TextEmbedding(
+            model_name=model_name,
+            cache_dir=cache_dir,
+            specific_model_path=specific_model_path,
+        )
+        self.batch_size = batch_size
+
+        # Identificativo del modello che produce i vettori (es. la versione
+        # int8 è un modello diverso): entra negli ID dei chunk
+        if specific_model_path:
+            self.id_modello = os.path.basename(os.path.normpath(specific_model_path))
+        else:
+            self.id_modello = model_name
+
+        # Warmup: la prima inferenza di ONNX Runtime alloca i buffer e prepara
+        # i kernel; la faccio subito così la prima domanda non paga questo costo
+        if model_warmup:
+            self.embed_query("warmup")
+
+    @staticmethod
+    def _normalizza(vettore: np.ndarray) -> list:
+        # Vettori di lunghezza 1: il prodotto scalare coincide con il coseno
+        norma = np.linalg.norm(vettore)
+        return (vettore / norma if norma > 0 else vettore).tolist()
+
+    def embed_documents(self, texts: list) -> list:
+        # parallel=0 = usa tutti i core della CPU
+        vettori = self.client.embed(texts, batch_size=self.batch_size, parallel=0)
+        return [self._normalizza(v) for v in vettori]
+
+    def embed_query(self, text: str) -> list:
+        return self._normalizza(next(self.client.query_embed([text])))
+
+
+# Istanza unica del modello di embedding, creata alla prima richiesta
+# (vedi _crea_embeddings): evita di ricaricare il modello più volte
+_EMBEDDINGS: Optional[FastEmbedEmbeddings] = None
+
+
+def _crea_embeddings() -> FastEmbedEmbeddings:
     """
-    Crea la funzione di embedding usando sentence-transformers.
+    Crea (una sola volta) la funzione di embedding usando fastembed (ONNX Runtime).
 
     Funzione di utilità usata sia per creare che per caricare il vector store,
-    così il modello di embedding è sempre lo stesso.
+    così il modello di embedding è sempre lo stesso. Il modello viene caricato
+    alla prima chiamata; le successive riusano la stessa istanza.
 
-    Usa il modello dalla cartella locale models/ (scaricato da setup_offline.py).
-    Se la cartella locale non esiste, prova a scaricarlo da HuggingFace
+    Usa il modello dalla cartella locale models/ (scaricato da setup_offline.py),
+    preferendo la versione quantizzata int8 se è stata creata.
+    Se il modello non è in cache, prova a scaricarlo da HuggingFace
     (ma fallirà in modalità offline).
 
     Returns:
-        oggetto HuggingFaceEmbeddings pronto per trasformare testo in vettori
+        oggetto FastEmbedEmbeddings pronto per trasformare testo in vettori
     """
-    # Uso il percorso locale se il modello è stato scaricato con setup_offline.py,
-    # altrimenti uso il nome del modello HuggingFace (richiede internet la prima volta)
-    if os.path.exists(config.EMBEDDING_MODEL_PATH):
-        model_name = config.EMBEDDING_MODEL_PATH
-    else:
-        model_name = config.EMBEDDING_MODEL
+    global _EMBEDDINGS
+    if _EMBEDDINGS is None:
+        # Uso il modello int8 se setup_offline.py l'ha creato (tutti i file
+        # presenti), altrimenti il modello float32 dalla cache di fastembed
+        int8_completo = all(
+            os.path.exists(os.path.join(config.EMBEDDING_MODEL_INT8_PATH, nome))
+            for nome in config.EMBEDDING_MODEL_INT8_FILES
+        )
+        if int8_completo:
+            percorso_modello = config.EMBEDDING_MODEL_INT8_PATH
+        else:
+            percorso_modello = None
+
+        _EMBEDDINGS = FastEmbedEmbeddings(
+            model_name=config.EMBEDDING_MODEL_FASTEMBED,
+            cache_dir=config.MODELS_DIR,  # cache locale popolata da setup_offline.py
+            batch_size=config.EMBEDDING_BATCH_SIZE,  # chunk per ogni forward pass
+            model_warmup=True,  # motore già "caldo" per indicizzazione e ricerche
+            specific_model_path=percorso_modello,
+        )
+    return _EMBEDDINGS
+
+
+def _id_chunk(chunk, id_modello: str) -> str:
+    """
+    Calcola un ID deterministico per un chunk (hash di modello, file, pagina e testo).
+
+    Il modello di embedding fa parte dell'ID: se cambia (es. passando alla
+    versione int8), tutti i chunk risultano nuovi e vengono ricalcolati,
+    mentre quelli vecchi vengono cancellati come obsoleti.
+
+    Args:
+        chunk: Document di cui calcolare l'ID
+        id_modello: identificativo del modello di embedding
 
-    return HuggingFaceEmbeddings(
-        model_name=model_name,
-        model_kwargs={"device": "cpu"},  # usa la CPU (funziona ovunque)
+    Returns:
+        stringa esadecimale di 32 caratteri
+    """
+    chiave = "|".join(
+        [
+            id_modello,
+            str(chunk.metadata.get("source_filename", "")),
+            str(chunk.metadata.get("page", "")),
+            chunk.page_content,
+        ]
     )
+    return hashlib.blake2b(chiave.encode(), digest_size=16).hexdigest()
+
+
+def _apri_chroma(persist_directory: str, embeddings: Embeddings) -> Chroma:
+    """
+    Apre (o crea) la collezione ChromaDB con i parametri dell'indice HNSW.
+
+    ChromaDB cerca i vicini con un grafo HNSW: i parametri in
+    config.CHROMA_HNSW regolano precisione e velocità della ricerca.
+    ChromaDB li applica solo quando crea la collezione: se quella su disco
+    è stata creata con parametri diversi (es. da una versione precedente),
+    la cancello e la ricreo vuota, da re-indicizzare.
+
+    Args:
+        persist_directory: cartella del database su disco
+        embeddings: funzione di embedding usata per le ricerche
+
+    Returns:
+        oggetto Chroma collegato alla collezione
+    """
+
+    def apri() -> Chroma:
+        return Chroma(
+            persist_directory=persist_directory,
+            embedding_function=embeddings,
+            collection_name=config.COLLECTION_NAME,
+            collection_metadata=config.CHROMA_HNSW,
+        )
+
+    vector_store = apri()
+
+    # Controllo che la collezione esistente usi i parametri attuali
+    metadati = vector_store._collection.metadata or {}
+    diversi = {
+        chiave: metadati.get(chiave)
+        for chiave, valore in config.CHROMA_HNSW.items()
+        if metadati.get(chiave) != valore
+    }
+    if diversi:
+        print(f"⚠️ Indice creato con parametri HNSW diversi da config.py: {diversi}")
+        print("   Ricreo la collezione: serve re-indicizzare i documenti.")
+        vector_store.delete_collection()
+        vector_store = apri()
+
+    return vector_store
 
 
 def crea_vector_store(
@@ -174,9 +353,11 @@ def crea_vector_store(
     Crea il database vettoriale da una lista di chunk.
 
     Cosa fa:
-    1. Prende ogni chunk di testo
-    2. Lo trasforma in un vettore numerico (embedding) usando sentence-transformers
+    1. Prende ogni chunk di testo e gli assegna un ID deterministico (hash)
+    2. Lo trasforma in un vettore numerico (embedding) usando fastembed,
+       solo se non è già presente nel database
     3. Salva vettore + testo + metadati in ChromaDB
+    4. Cancella dal database i chunk che non esistono più
 
     ChromaDB è un database vettoriale che permette di cercare
     per "similarità semantica" - cioè trova testi con significato simile,
@@ -192,21 +373,52 @@ def crea_vector_store(
     print(f"🧮 Creazione embeddings con modello: {config.EMBEDDING_MODEL}")
     print("   (il primo avvio scarica il modello, ~80MB, poi è tutto locale)")
 
-    # Creo la funzione di embedding usando sentence-transformers
+    # Creo la funzione di embedding usando fastembed
     # Questo modello trasforma testo -> vettore di 384 dimensioni
     embeddings = _crea_embeddings()
 
-    # Creo il vector store ChromaDB e ci salvo tutti i chunk
+    # ID deterministici: hash di modello + file + pagina + testo di ogni chunk.
+    # Lo stesso chunk ha sempre lo stesso ID, quindi re-indicizzare è idempotente
+    # (uso un dizionario per scartare eventuali chunk identici ripetuti)
+    chunk_per_id = {
+        _id_chunk(chunk, embeddings.id_modello): chunk for chunk in chunks
+    }
+
+    # Apro (o creo) il vector store ChromaDB
     # persist_directory = dove salvare su disco (così non devo ri-indicizzare ogni volta)
-    vector_store = Chroma.from_documents(
-        documents=chunks,
-        embedding=embeddings,
-        persist_directory=persist_directory,
-        collection_name=config.COLLECTION_NAME,
-    )
+    vector_store = _apri_chroma(persist_directory, embeddings)
+
+    # Confronto gli ID salvati con quelli attuali:
+    # - quelli già presenti li salto (il loro embedding è già salvato)
+    # - quelli che non esistono più (PDF eliminati o modificati) li cancello
+    salvati = set(vector_store._collection.get(include=[])["ids"])
+    esistenti = salvati.intersection(chunk_per_id)
+    obsoleti = list(salvati - esistenti)
+    ids = [id_chunk for id_chunk in chunk_per_id if id_chunk not in esistenti]
+
+    blocco = config.CHROMA_BATCH_SIZE
+    for i in range(0, len(obsoleti), blocco):
+        vector_store._collection.delete(ids=obsoleti[i : i + blocco])
+    testi = [chunk_per_id[id_chunk].page_content for id_chunk in ids]
+    metadati = [chunk_per_id[id_chunk].metadata for id_chunk in ids]
+
+    # Calcolo gli embeddings dei nuovi chunk in un'unica chiamata:
+    # il modello lavora a batch grandi invece di tante chiamate piccole
+    vettori = embeddings.embed_documents(testi) if testi else []
+
+    # Scrivo nel database a blocchi grandi: meno transazioni SQLite
+    for i in range(0, len(ids), blocco):
+        vector_store._collection.add(
+            ids=ids[i : i + blocco],
+            embeddings=vettori[i : i + blocco],
+            documents=testi[i : i + blocco],
+            metadatas=metadati[i : i + blocco],
+        )
 
-    print(f"💾 Vector store creato e salvato in: {persist_directory}")
-    print(f"   Contiene {len(chunks)} vettori")
+    print(f"💾 Vector store salvato in: {persist_directory}")
+    print(f"   Aggiunti {len(ids)} nuovi chunk ({len(esistenti)} già presenti)")
+    print(f"   Rimossi {len(obsoleti)} chunk obsoleti")
+    print(f"   Contiene {vector_store._collection.count()} vettori")
 
     return vector_store
 
@@ -237,11 +449,7 @@ def carica_vector_store(
     embeddings = _crea_embeddings()
 
     # Carico il database esistente
-    vector_store = Chroma(
-        persist_directory=persist_directory,
-        embedding_function=embeddings,
-        collection_name=config.COLLECTION_NAME,
-    )
+    vector_store = _apri_chroma(persist_directory, embeddings)
 
     # Verifico che ci siano effettivamente dei dati
     conteggio = vector_store._collection.count()
@@ -273,10 +481,17 @@ def crea_catena_rag(vector_store: Chroma) -> dict:
     Returns:
         dizionario con i componenti: retriever, llm, prompt
     """
-    # Configuro il retriever: cerca i top-K chunk più simili alla domanda
+    # Configuro il retriever: cerca i top-K chunk più rilevanti per la domanda
+    # MMR (Maximal Marginal Relevance): tra i FETCH_K chunk più simili sceglie
+    # i TOP_K più vari, scartando quelli quasi duplicati (es. stessa pagina).
+    # Meno chunk ripetuti = prompt più corto = risposta più veloce
     retriever = vector_store.as_retriever(
-        search_type="similarity",  # ricerca per similarità coseno
-        search_kwargs={"k": config.TOP_K},  # quanti chunk recuperare
+        search_type="mmr",
+        search_kwargs={
+            "k": config.TOP_K,  # quanti chunk recuperare
+            "fetch_k": config.FETCH_K,  # candidati tra cui scegliere
+            "lambda_mult": config.MMR_LAMBDA,  # bilancio rilevanza/varietà
+        },
     )
 
     # Creo il modello LLM (Ollama locale)
@@ -284,12 +499,21 @@ def crea_catena_rag(vector_store: Chroma) -> dict:
         model=config.OLLAMA_MODEL,
         base_url=config.OLLAMA_BASE_URL,
         temperature=config.OLLAMA_TEMPERATURE,
+        # Il client HTTP tiene aperta la connessione tra una domanda e l'altra
+        # (di default la chiude dopo 5 secondi di inattività)
+        client_kwargs={
+            "limits": httpx.Limits(
+                keepalive_expiry=config.OLLAMA_KEEPALIVE_SECONDI
+            )
+        },
     )
 
     # Creo il template del prompt
+    # jinja2 riceve direttamente la lista dei Document: nessuna join in Python
     prompt = PromptTemplate(
         template=TEMPLATE_PROMPT,
-        input_variables=["context", "question"],
+        input_variables=["context_docs", "question"],
+        template_format="jinja2",
     )
 
     print("🔗 Catena RAG creata e pronta!")
@@ -319,12 +543,6 @@ def indicizza_documenti() -> Chroma:
     print("🚀 INIZIO INDICIZZAZIONE DOCUMENTI")
     print("=" * 50)
 
-    # Step 0: cancello il vecchio vector store se esiste
-    # Questo evita che chunk di documenti eliminati restino nel database
-    if os.path.exists(config.CHROMA_DB_DIR):
-        shutil.rmtree(config.CHROMA_DB_DIR)
-        print("🗑️ Vecchio indice cancellato")
-
     # Step 1: carica i PDF
     documenti = carica_pdf()
     if not documenti:
@@ -345,14 +563,93 @@ def indicizza_documenti() -> Chroma:
     return vector_store
 
 
+def _stream_risposta(llm: OllamaLLM, prompt_finale: str) -> Iterator[str]:
+    """
+    Genera la risposta dell'LLM un pezzo (token) alla volta.
+
+    Così l'interfaccia può mostrare il testo mentre viene generato,
+    invece di aspettare la risposta completa. Alla fine accumula
+    il testo completo per il log.
+
+    Args:
+        llm: il modello Ollama
+        prompt_finale: prompt con contesto + domanda
+
+    Yields:
+        i pezzi di testo generati dal modello
+    """
+    pezzi = []
+    for pezzo in llm.stream(prompt_finale):
+        pezzi.append(pezzo)
+        yield pezzo
+
+    print(f"✅ Risposta generata! ({len(''.join(pezzi))} caratteri)")
+
+
+def riscalda_llm(llm: OllamaLLM) -> None:
+    """
+    Chiede a Ollama di generare 1 solo token, per caricare il modello in RAM.
+
+    Se il modello è già carico costa pochissimo; se non lo è, il caricamento
+    avviene adesso invece che durante la prima vera domanda.
+    Gli errori non fermano l'app (la vera richiesta li mostrerà),
+    ma vengono stampati nel log.
+
+    Args:
+        llm: il modello Ollama da "riscaldare"
+    """
+    try:
+        llm.invoke("ok", options={"num_predict": 1})
+    except Exception as e:
+        print(f"⚠️ Warmup del modello Ollama non riuscito: {e}")
+
+
+def _modello_in_memoria() -> bool:
+    """
+    Chiede a Ollama (endpoint /api/ps) se il modello è già caricato in RAM.
+
+    Returns:
+        True se il modello risulta caricato, False altrimenti
+        (anche se Ollama non risponde)
+    """
+    try:
+        risposta = httpx.get(f"{config.OLLAMA_BASE_URL}/api/ps", timeout=2)
+        risposta.raise_for_status()
+        modelli = risposta.json().get("models", [])
+    except Exception:
+        return False
+
+    return any(
+        config.OLLAMA_MODEL in (modello.get("name"), modello.get("model"))
+        for modello in modelli
+    )
+
+
+def _riscalda_se_serve(llm: OllamaLLM) -> None:
+    """
+    Riscalda Ollama solo se il modello non è già in RAM.
+
+    Con il modello già caricato costa solo una richiesta a /api/ps
+    (pochi millisecondi) e non ritarda la risposta; altrimenti il modello
+    viene caricato adesso (es. dopo che Ollama l'ha scaricato per inattività).
+
+    Args:
+        llm: il modello Ollama da "riscaldare"
+    """
+    if not _modello_in_memoria():
+        riscalda_llm(llm)
+
+
 def fai_domanda(domanda: str, catena: dict) -> dict:
     """
     Fa una domanda alla pipeline RAG e restituisce la risposta con le fonti.
 
     Esegue la pipeline RAG passo per passo:
     1. Usa il retriever per trovare i chunk più simili alla domanda
+       (intanto, in un altro thread, Ollama carica il modello se serve)
     2. Combina i chunk nel prompt insieme alla domanda
-    3. Manda il prompt all'LLM per generare la risposta
+    3. Prepara lo stream della risposta dall'LLM (generata token per token
+       mentre viene letta)
 
     Args:
         domanda: la domanda dell'utente in linguaggio naturale
@@ -360,8 +657,10 @@ def fai_domanda(domanda: str, catena: dict) -> dict:
 
     Returns:
         dizionario con:
-        - "risposta": il testo generato dal modello
-        - "fonti": lista di dict con info sui chunk usati (documento, pagina, testo)
+        - "risposta": generatore con i pezzi di testo prodotti dal modello
+          (es. da passare a st.write_stream)
+        - "fonti": lista di dict con info sui chunk usati (documento, pagina
+          e "_doc", il Document del chunk)
     """
     print(f"\n❓ Domanda: {domanda}")
     print("🔍 Ricerca chunk rilevanti e generazione risposta...")
@@ -373,33 +672,36 @@ def fai_domanda(domanda: str, catena: dict) -> dict:
 
     # Step 1: cerco i chunk più simili alla domanda nel vector store
     # Il retriever usa la similarità coseno tra l'embedding della domanda
-    # e gli embeddings dei chunk salvati
-    documenti_trovati = retriever.invoke(domanda)
-
-    # Step 2: combino il testo dei chunk trovati in un unico "contesto"
-    # Questo contesto verrà inserito nel prompt per l'LLM
-    contesto = "\n\n---\n\n".join([doc.page_content for doc in documenti_trovati])
-
-    # Step 3: creo il prompt finale con contesto + domanda
-    prompt_finale = prompt.format(context=contesto, question=domanda)
-
-    # Step 4: mando il prompt all'LLM (Ollama) e ottengo la risposta
-    risposta = llm.invoke(prompt_finale)
+    # e gli embeddings dei chunk salvati (con MMR per evitare duplicati).
+    # Intanto un thread controlla se Ollama ha il modello in RAM e, solo se
+    # non ce l'ha, lo carica: il caricamento si sovrappone alla ricerca
+    # invece di sommarsi. Con il modello già caricato non si aspetta nulla
+    with ThreadPoolExecutor(max_workers=1) as ex:
+        warmup = ex.submit(_riscalda_se_serve, llm)
+        documenti_trovati = retriever.invoke(domanda)
+        warmup.result()
+
+    # Step 2-3: creo il prompt finale con i chunk trovati + domanda
+    # Il template scrive il testo dei chunk direttamente nel prompt
+    prompt_finale = prompt.format(context_docs=documenti_trovati, question=domanda)
+
+    # Step 4: preparo lo stream della risposta dall'LLM (Ollama)
+    # La generazione parte quando il chiamante inizia a leggere lo stream
+    risposta = _stream_risposta(llm, prompt_finale)
 
     # Estraggo le informazioni sulle fonti usate
-    # Così l'utente sa da dove viene ogni informazione
+    # Così l'utente sa da dove viene ogni informazione.
+    # Non copio il testo: tengo un riferimento al Document (già in memoria)
+    # e l'interfaccia ne estrae un pezzo solo quando lo mostra
     fonti = []
     for doc in documenti_trovati:
         fonte = {
             "documento": doc.metadata.get("source_filename", "sconosciuto"),
             "pagina": doc.metadata.get("page", "n/a"),
-            "testo_chunk": doc.page_content[:300]
-            + "...",  # mostro solo i primi 300 char
+            "_doc": doc,
         }
         fonti.append(fonte)
 
-    print("✅ Risposta generata!")
-
     return {
         "risposta": risposta,
         "fonti": fonti,
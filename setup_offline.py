@@ -3,20 +3,87 @@ Script di setup da eseguire UNA SOLA VOLTA con internet.
 
 Scarica il modello di embedding (all-MiniLM-L6-v2) nella cartella locale
 models/ del progetto, così l'app può funzionare completamente offline.
+Se sono installate le dipendenze opzionali (requirements-setup.txt),
+crea anche una versione quantizzata int8 del modello, più veloce su CPU.
 
 Uso:
     conda activate personal
+    pip install -r requirements-setup.txt   # opzionale, per il modello int8
     python setup_offline.py
 """
 
 import os
-from sentence_transformers import SentenceTransformer
+import shutil
+from fastembed import TextEmbedding
 import config
 
+# Questo script serve proprio a scaricare i modelli: annullo la modalità
+# offline impostata da config.py (vale per i moduli importati dopo,
+# es. transformers e optimum in quantizza_modello())
+os.environ["HF_HUB_OFFLINE"] = "0"
+os.environ["TRANSFORMERS_OFFLINE"] = "0"
+
 # Cartella locale dove salvare il modello (dentro il progetto)
 MODELS_DIR = os.path.join(os.path.dirname(__file__), "models")
 
 
+def quantizza_modello(model_int8_path: str) -> None:
+    """
+    Crea la versione quantizzata int8 del modello di embedding.
+
+    Usa optimum + transformers (che portano con sé PyTorch): sono dipendenze
+    opzionali, servono solo qui. Se non sono installate la quantizzazione
+    viene saltata e l'app userà il modello float32.
+
+    Args:
+        model_int8_path: cartella dove salvare il modello int8
+    """
+    try:
+        from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+        from optimum.onnxruntime.configuration import AutoQuantizationConfig
+        from transformers import AutoTokenizer
+    except ImportError:
+        print("ℹ️ Quantizzazione int8 saltata: optimum/transformers non installati.")
+        print("   Per attivarla: pip install -r requirements-setup.txt")
+        return
+
+    print("⚙️ Quantizzazione int8 del modello (ONNX Runtime)...")
+
+    # Lavoro in una cartella temporanea e la rinomino solo alla fine:
+    # se qualcosa fallisce a metà non resta un modello int8 incompleto
+    cartella_tmp = model_int8_path + ".tmp"
+    if os.path.exists(cartella_tmp):
+        shutil.rmtree(cartella_tmp)
+
+    # Esporto il modello in ONNX e lo quantizzo in modo dinamico:
+    # i pesi diventano int8, le attivazioni sono quantizzate al volo
+    model = ORTModelForFeatureExtraction.from_pretrained(
+        config.EMBEDDING_MODEL_FASTEMBED, export=True
+    )
+    quantizer = ORTQuantizer.from_pretrained(model)
+    quantizer.quantize(
+        save_dir=cartella_tmp,
+        quantization_config=AutoQuantizationConfig.avx512_vnni(
+            is_static=False, per_channel=False
+        ),
+        file_suffix="",  # salva come model.onnx, il nome atteso da fastembed
+    )
+
+    # fastembed ha bisogno anche del tokenizer e del config del modello
+    AutoTokenizer.from_pretrained(config.EMBEDDING_MODEL_FASTEMBED).save_pretrained(
+        cartella_tmp
+    )
+    model.config.save_pretrained(cartella_tmp)
+
+    # Tutto pronto: sostituisco l'eventuale cartella incompleta di un tentativo
+    # precedente con quella nuova
+    if os.path.exists(model_int8_path):
+        shutil.rmtree(model_int8_path)
+    os.replace(cartella_tmp, model_int8_path)
+
+    print(f"✅ Modello int8 salvato in: {model_int8_path}")
+
+
 def main():
     print("=" * 50)
     print("🔧 SETUP OFFLINE")
@@ -25,20 +92,28 @@ def main():
     # Creo la cartella models/ se non esiste
     os.makedirs(MODELS_DIR, exist_ok=True)
 
-    # Percorso dove salvare il modello di embedding
-    model_path = os.path.join(MODELS_DIR, config.EMBEDDING_MODEL)
+    print(f"📥 Scaricamento modello: {config.EMBEDDING_MODEL_FASTEMBED}")
+    print("   (circa 80MB, serve solo questa volta)")
 
-    if os.path.exists(model_path):
-        print(f"✅ Modello già scaricato in: {model_path}")
-    else:
-        print(f"📥 Scaricamento modello: {config.EMBEDDING_MODEL}")
-        print("   (circa 80MB, serve solo questa volta)")
+    # fastembed scarica la versione ONNX del modello nella cache models/
+    # (se è già presente non la riscarica)
+    TextEmbedding(
+        model_name=config.EMBEDDING_MODEL_FASTEMBED,
+        cache_dir=MODELS_DIR,
+    )
 
-        # Scarico il modello da HuggingFace e lo salvo in locale
-        model = SentenceTransformer(config.EMBEDDING_MODEL)
-        model.save(model_path)
+    print(f"✅ Modello salvato in: {MODELS_DIR}")
 
-        print(f"✅ Modello salvato in: {model_path}")
+    # Creo anche la versione quantizzata int8 del modello (se possibile)
+    model_int8_path = config.EMBEDDING_MODEL_INT8_PATH
+    int8_completo = all(
+        os.path.exists(os.path.join(model_int8_path, nome))
+        for nome in config.EMBEDDING_MODEL_INT8_FILES
+    )
+    if int8_completo:
+        print(f"✅ Modello int8 già presente in: {model_int8_path}")
+    else:
+        quantizza_modello(model_int8_path)
 
     print()
     print("=" * 50)